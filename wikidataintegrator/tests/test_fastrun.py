@@ -186,4 +186,142 @@ def test_append_props():
                                        base_data_type=wdi_core.WDBaseDataType, engine=wdi_core.WDItemEngine,
                                        use_refs=True)
     assert frc.write_required(data=statements, append_props=['P527'], cqid=qid) is True
-    assert frc.write_required(data=statements, cqid=qid)
\ No newline at end of file
+    assert frc.write_required(data=statements, cqid=qid)
+
+def test_multiple_statements_same_prop():
+    qid = 'Q3402672'
+    frc = fake_query_data_append_props(base_filter={'P352': '', 'P703': 'Q15978631'},
+                                       base_data_type=wdi_core.WDBaseDataType, engine=wdi_core.WDItemEngine)
+
+    # all three values, in a different order than they are stored
+    statements = [wdi_core.WDItemID(value='Q24782625', prop_nr='P527'),
+                  wdi_core.WDItemID(value='Q24784025', prop_nr='P527'),
+                  wdi_core.WDItemID(value='Q24743729', prop_nr='P527')]
+    assert frc.write_required(data=statements, cqid=qid) is False
+
+    # one value missing, so one reconstructed statement is left over
+    assert frc.write_required(data=statements[:2], cqid=qid) is True
+
+    # the same value twice can only match one of the existing statements
+    statements = [wdi_core.WDItemID(value='Q24782625', prop_nr='P527'),
+                  wdi_core.WDItemID(value='Q24782625', prop_nr='P527'),
+                  wdi_core.WDItemID(value='Q24743729', prop_nr='P527')]
+    assert frc.write_required(data=statements, cqid=qid) is True
+
+
+def test_update_frc_from_query():
+    frc = wdi_fastrun.FastRunContainer(base_data_type=wdi_core.WDBaseDataType, engine=wdi_core.WDItemEngine)
+    # rows as returned by format_query_results. one row per qualifier/reference of a statement
+    r = [{'item': 'Q14911732', 'sid': 'S1', 'v': 'Q847102', 'pq': 'P659', 'qval': 'Q21067546',
+          'ref': 'R1', 'pr': 'P248', 'rval': 'Q29458763'},
+         {'item': 'Q14911732', 'sid': 'S1', 'v': 'Q847102', 'pq': 'P659', 'qval': 'Q20966585',
+          'ref': 'R1', 'pr': 'P594', 'rval': 'ENSG00000123374'},
+         {'item': 'Q14911732', 'sid': 'S2', 'v': '+42', 'unit': 'Q11573'}]
+    frc.update_frc_from_query(r, 'P1057')
+
+    assert frc.get_all_data() == {'Q14911732': {'P1057': {
+        'S1': {'v': 'Q847102', 'unit': '1',
+               'qual': {('P659', 'Q21067546'), ('P659', 'Q20966585')},
+               'ref': {'R1': {('P248', 'Q29458763'), ('P594', 'ENSG00000123374')}}},
+        'S2': {'v': '+42', 'unit': 'Q11573', 'qual': set(), 'ref': {}}}}}
+
+
+class fake_engine_prop_datatypes(wdi_core.WDItemEngine):
+    calls = []
+
+    @staticmethod
+    def mediawiki_api_call(method, mediawiki_api_url=None, session=None, max_retries=1000, retry_after=60, **kwargs):
+        ids = kwargs['params']['ids'].split('|')
+        fake_engine_prop_datatypes.calls.append(ids)
+        dts = {'P248': 'wikibase-item', 'P594': 'external-id', 'P813': 'time'}
+        return {'entities': {x: {'id': x, 'type': 'property', 'datatype': dts[x]} for x in ids}}
+
+
+def test_bulk_prop_datatypes():
+    fake_engine_prop_datatypes.calls = []
+    frc = wdi_fastrun.FastRunContainer(base_data_type=wdi_core.WDBaseDataType, engine=fake_engine_prop_datatypes)
+    frc.prop_dt_map = {'P1057': 'wikibase-item'}
+    frc.prop_data['Q14911732'] = {'P1057': {
+        'fake statement id': {
+            'qual': {('P594', 'ENSG00000123374')},
+            'ref': {'fake ref id': {('P248', 'Q29458763'), ('P813', '+2017-01-01T00:00:00Z')}},
+            'v': 'Q847102',
+            'unit': '1'}}}
+
+    statements = frc.reconstruct_statements('Q14911732')
+    # the datatypes of all three qualifier and reference props are retrieved with a single request
+    assert fake_engine_prop_datatypes.calls == [['P248', 'P594', 'P813']]
+    # they are cached separately, prop_dt_map only has the props with queried data
+    assert frc.prop_dt_map == {'P1057': 'wikibase-item'}
+    assert frc._prop_dt_cache == {'P248': 'wikibase-item', 'P594': 'external-id', 'P813': 'time'}
+    assert len(statements) == 1
+    assert type(statements[0].get_qualifiers()[0]) == wdi_core.WDExternalID
+
+
+class fake_engine_query_data_bulk(fake_engine_prop_datatypes):
+    queries = []
+
+    @staticmethod
+    def execute_sparql_query(query, prefix=None, endpoint=None, user_agent=None, as_dataframe=False,
+                             max_retries=1000, retry_after=60):
+        fake_engine_query_data_bulk.queries.append(query)
+        uri = lambda x: {'type': 'uri', 'value': 'http://www.wikidata.org/entity/' + x}
+        return {'results': {'bindings': [
+            {'p': {'type': 'uri', 'value': 'http://www.wikidata.org/prop/P248'}, 'item': uri('Q14911732'),
+             'sid': uri('S1'), 'v': uri('Q29458763')},
+            {'p': {'type': 'uri', 'value': 'http://www.wikidata.org/prop/P594'}, 'item': uri('Q14911732'),
+             'sid': uri('S2'), 'v': {'type': 'literal', 'value': 'ENSG00000123374'}},
+        ]}}
+
+
+def test_query_data_bulk():
+    fake_engine_query_data_bulk.queries = []
+    frc = wdi_fastrun.FastRunContainer(base_filter={'P594': ''}, base_data_type=wdi_core.WDBaseDataType,
+                                       engine=fake_engine_query_data_bulk)
+    statements = [wdi_core.WDItemID(value='Q29458763', prop_nr='P248'),
+                  wdi_core.WDExternalID(value='ENSG00000123374', prop_nr='P594')]
+    assert frc.write_required(data=statements) is False
+    assert frc.current_qid == 'Q14911732'
+
+    # both props were retrieved with one query
+    assert len(fake_engine_query_data_bulk.queries) == 1
+    assert frc.prop_data['Q14911732']['P248']['S1']['v'] == 'Q29458763'
+    assert frc.prop_data['Q14911732']['P594']['S2']['v'] == 'ENSG00000123374'
+
+
+class fake_engine_qualifier_datatypes(wdi_core.WDItemEngine):
+    requests = []
+
+    def __init__(self, wd_item_id='', **kwargs):
+        # only used by get_prop_datatype to load a single property
+        fake_engine_qualifier_datatypes.requests.append(('engine', wd_item_id))
+        self.entity_metadata = {'datatype': 'wikibase-item'}
+
+    @staticmethod
+    def mediawiki_api_call(method, mediawiki_api_url=None, session=None, max_retries=1000, retry_after=60, **kwargs):
+        ids = kwargs['params']['ids'].split('|')
+        fake_engine_qualifier_datatypes.requests.append(('bulk', ids))
+        return {'entities': {x: {'id': x, 'type': 'property', 'datatype': 'wikibase-item'} for x in ids}}
+
+    @staticmethod
+    def execute_sparql_query(query, prefix=None, endpoint=None, user_agent=None, as_dataframe=False,
+                             max_retries=1000, retry_after=60):
+        uri = lambda x: {'type': 'uri', 'value': 'http://www.wikidata.org/entity/' + x}
+        return {'results': {'bindings': [
+            {'item': uri('Q14911732'), 'sid': uri('S1'), 'v': uri('Q847102'),
+             'pq': {'type': 'uri', 'value': 'http://www.wikidata.org/prop/qualifier/P659'}, 'qval': uri('Q20966585')},
+        ]}}
+
+
+def test_qualifier_datatypes_from_query():
+    fake_engine_qualifier_datatypes.requests = []
+    frc = wdi_fastrun.FastRunContainer(base_filter={'P1057': ''}, base_data_type=wdi_core.WDBaseDataType,
+                                       engine=fake_engine_qualifier_datatypes)
+    statements = [wdi_core.WDItemID(value='Q847102', prop_nr='P1057',
+                                    qualifiers=[wdi_core.WDItemID('Q20966585', 'P659', is_qualifier=True)])]
+    assert frc.write_required(data=statements) is False
+
+    # the qualifier prop found in the query results is looked up once, in bulk, and not again when reconstructing
+    assert fake_engine_qualifier_datatypes.requests == [('bulk', ['P1057']), ('bulk', ['P659'])]
+    assert 'P659' not in frc.prop_dt_map
+    assert frc.prop_data['Q14911732']['P1057']['S1']['qual'] == {('P659', 'Q20966585')}
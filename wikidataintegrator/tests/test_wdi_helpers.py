@@ -1,4 +1,9 @@
-from wikidataintegrator.wdi_helpers import PublicationHelper, Release, id_mapper
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from wikidataintegrator import wdi_core
+from wikidataintegrator.wdi_helpers import PublicationHelper, Release, id_mapper, release
+from wikidataintegrator.wdi_helpers.wikibase_helper import WikibaseHelper
 
 
 def test_get_pubmed_item():
@@ -36,6 +41,172 @@ def test_release_new_item_no_write():
         assert "login required to create item" == str(e)
 
 
+class fake_wikidata:
+    """
+    Stands in for wikidata in the offline Release tests: releases of a fake database (edition -> qid) and a log of the
+    release queries and writes made
+    """
+    database = 'Q4115189'
+    releases = {}
+    queries = []
+    writes = []
+
+    @staticmethod
+    def id_mapper(prop, filters=None, endpoint=None, session=None, **kwargs):
+        fake_wikidata.queries.append(filters)
+        return dict(fake_wikidata.releases) or None
+
+    @staticmethod
+    def try_write(wd_item, record_id, record_prop, login, edit_summary='', write=True):
+        edition = record_id.split('|')[0]
+        fake_wikidata.writes.append(edition)
+        wd_item.wd_item_id = fake_wikidata.releases[edition] = 'Q{}'.format(1000 + len(fake_wikidata.writes))
+        return True
+
+
+class fake_release_engine(wdi_core.WDItemEngine):
+    def __init__(self, data=None, **kwargs):
+        self.data = data
+        self.wd_item_id = ''
+
+    def set_label(self, label, lang='en'):
+        pass
+
+    def set_description(self, description, lang='en'):
+        pass
+
+
+def fake_release_env(monkeypatch, releases):
+    # a WikibaseHelper for wikidata doesn't need its pid/qid maps, get_pid and get_qid return their argument
+    helper = WikibaseHelper.__new__(WikibaseHelper)
+    helper.sparql_endpoint_url = 'https://query.wikidata.org/sparql'
+    helper.session = None
+    monkeypatch.setattr(release, '_helper_for', lambda sparql_endpoint_url, session=None: helper)
+    monkeypatch.setattr(release, 'id_mapper', fake_wikidata.id_mapper)
+    monkeypatch.setattr(release, 'try_write', fake_wikidata.try_write)
+    monkeypatch.setattr(wdi_core, 'WDItemEngine', fake_release_engine)
+    Release.invalidate(fake_wikidata.database)
+    fake_wikidata.releases = dict(releases)
+    fake_wikidata.queries = []
+    fake_wikidata.writes = []
+
+
+def fake_release(edition):
+    return Release("Fake Release " + edition, "Release {} of Fake".format(edition), edition,
+                   edition_of_wdid=fake_wikidata.database)
+
+
+def test_release_create_after_lookup_without_login(monkeypatch):
+    fake_release_env(monkeypatch, {'8': 'Q1'})
+    try:
+        fake_release('9').get_or_create()
+        assert False
+    except ValueError as e:
+        assert "login required to create item" == str(e)
+    # not queried again without a login
+    try:
+        fake_release('9').get_or_create()
+        assert False
+    except ValueError:
+        pass
+    assert len(fake_wikidata.queries) == 1
+
+    # created by someone else in the meantime. it is found instead of being created again
+    fake_wikidata.releases['9'] = 'Q777'
+    assert fake_release('9').get_or_create(login='fake login') == 'Q777'
+    assert fake_wikidata.writes == []
+
+    # really doesn't exist: checked again and created
+    assert fake_release('10').get_or_create(login='fake login') == 'Q1001'
+    assert fake_wikidata.writes == ['10']
+    assert fake_release('10').get_or_create() == 'Q1001'
+
+
+def test_release_create_keeps_cached_releases(monkeypatch):
+    fake_release_env(monkeypatch, {'8': 'Q1'})
+    assert fake_release('9').get_or_create(login='fake login') == 'Q1001'
+    assert len(fake_wikidata.queries) == 1
+
+    # the release created above is added to the cached releases of the database, which are still used
+    assert fake_release('8').get_or_create() == 'Q1'
+    assert fake_release('8').get_all_releases() == {'8': 'Q1', '9': 'Q1001'}
+    assert len(fake_wikidata.queries) == 1
+
+
+def test_release_bulk_get_or_create(monkeypatch):
+    fake_release_env(monkeypatch, {'1': 'Q1', '2': 'Q2'})
+    releases = [fake_release(edition) for edition in ['1', '3', '2', '4', '3', '5']]
+    qids = Release.bulk_get_or_create(releases, login='fake login')
+
+    # all releases of the database are looked up with one query, and each new release is written once
+    assert len(fake_wikidata.queries) == 1
+    assert sorted(fake_wikidata.writes) == ['3', '4', '5']
+    assert qids == [fake_wikidata.releases[edition] for edition in ['1', '3', '2', '4', '3', '5']]
+    assert qids[0] == 'Q1' and qids[2] == 'Q2' and qids[1] == qids[4]
+
+
+def test_release_concurrent_get_or_create(monkeypatch):
+    fake_release_env(monkeypatch, {'1': 'Q1'})
+
+    def slow_id_mapper(*args, **kwargs):
+        # give the other threads time to ask for the same release
+        time.sleep(0.1)
+        return fake_wikidata.id_mapper(*args, **kwargs)
+    monkeypatch.setattr(release, 'id_mapper', slow_id_mapper)
+
+    # only the first of the concurrent calls for the same release queries
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        qids = list(executor.map(lambda r: r.get_or_create(), [fake_release('1') for _ in range(8)]))
+    assert qids == ['Q1'] * 8
+    assert len(fake_wikidata.queries) == 1
+
+    # and only the first creates it
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        qids = list(executor.map(lambda r: r.get_or_create(login='fake login'), [fake_release('2') for _ in range(8)]))
+    assert qids == ['Q1001'] * 8
+    assert fake_wikidata.writes == ['2']
+
+
+def test_release_write_error(monkeypatch):
+    fake_release_env(monkeypatch, {})
+    error = wdi_core.WDApiError({'error': {'code': 'failed-save'}})
+    monkeypatch.setattr(release, 'try_write', lambda *args, **kwargs: error)
+
+    r = fake_release('9')
+    try:
+        r.get_or_create(login='fake login')
+        assert False
+    except wdi_core.WDApiError as e:
+        assert e is error
+    assert Release._release_cache.get((r.sparql_endpoint_url, r.edition_of_qid, r.edition)) is None
+
+    # tried again, not returned from the cache
+    monkeypatch.setattr(release, 'try_write', fake_wikidata.try_write)
+    assert r.get_or_create(login='fake login') == 'Q1001'
+
+
+def test_release_invalidate(monkeypatch):
+    fake_release_env(monkeypatch, {'1': 'Q1', '2': 'Q2'})
+    # surrounding whitespace doesn't make a different release
+    assert fake_release(' 1 ').get_or_create() == 'Q1'
+    assert fake_release('2').get_or_create() == 'Q2'
+    assert len(fake_wikidata.queries) == 1
+
+    # one release
+    fake_wikidata.releases['1'] = 'Q11'
+    Release.invalidate(fake_wikidata.database, edition=' 1')
+    assert fake_release('1').get_or_create() == 'Q11'
+    assert fake_release('2').get_or_create() == 'Q2'
+    assert len(fake_wikidata.queries) == 2
+
+    # all releases of the database
+    fake_wikidata.releases['2'] = 'Q22'
+    Release.invalidate(fake_wikidata.database)
+    assert not any(k[1] == fake_wikidata.database for k in Release._release_cache)
+    assert fake_release('2').get_or_create() == 'Q22'
+    assert len(fake_wikidata.queries) == 3
+
+
 def test_id_mapper():
     # get all uniprot to wdid, where taxon is human
     d = id_mapper("P352", (("P703", "Q15978631"),))
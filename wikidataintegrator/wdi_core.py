@@ -15,6 +15,11 @@ from pyshex import ShExEvaluator
 from rdflib import Graph
 from shexer.shaper import Shaper
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 from wikidataintegrator.wdi_backoff import wdi_backoff
 from wikidataintegrator.wdi_config import config
 from wikidataintegrator.wdi_fastrun import FastRunContainer
@@ -1193,7 +1198,7 @@ class WDItemEngine(object):
     @staticmethod
     @wdi_backoff()
     def execute_sparql_query(query, prefix=None, endpoint=None,
-                             user_agent=None, as_dataframe=False, max_retries=1000, retry_after=60):
+                             user_agent=None, as_dataframe=False, max_retries=1000, retry_after=60, session=None):
         """
         Static method which can be used to execute any SPARQL query
         :param prefix: The URI prefixes required for an endpoint, default is the Wikidata specific prefixes
@@ -1204,6 +1209,9 @@ class WDItemEngine(object):
         :type user_agent: str
         :param max_retries: The number time this function should retry in case of header reports.
         :param retry_after: the number of seconds should wait upon receiving either an error code or the WDQS is not reachable.
+        :param session: If a requests session is passed, it will be used. Reusing one session for many queries keeps
+            the connection to the endpoint open between them
+        :type session: requests.Session
         :return: The results of the query are returned in JSON format
         """
 
@@ -1223,10 +1231,11 @@ class WDItemEngine(object):
             'User-Agent': user_agent
         }
         response = None
+        post = session.post if session else requests.post
 
         for n in range(max_retries):
             try:
-                response = requests.post(sparql_endpoint_url, params=params, headers=headers)
+                response = post(sparql_endpoint_url, params=params, headers=headers)
             except requests.exceptions.ConnectionError as e:
                 print("Connection error: {}. Sleeping for {} seconds.".format(e, retry_after))
                 time.sleep(retry_after)
@@ -1242,7 +1251,15 @@ class WDItemEngine(object):
                 time.sleep(retry_after)
                 continue
             response.raise_for_status()
-            results = response.json()
+            if orjson is not None:
+                try:
+                    # orjson is a lot faster on the large results of fastrun queries
+                    results = orjson.loads(response.content)
+                except orjson.JSONDecodeError:
+                    # decode again to raise the error that the backoff handling expects
+                    results = response.json()
+            else:
+                results = response.json()
 
             if as_dataframe:
                 return WDItemEngine._sparql_query_result_to_df(results)
@@ -1,4 +1,6 @@
 import copy
+import operator
+import sys
 from collections import defaultdict
 from functools import lru_cache
 from itertools import chain
@@ -16,6 +18,12 @@ example_Q14911732 = {'P1057':
                      }
 
 
+def _local_name(uri):
+    # the last part of a uri, e.g. 'Q5' for 'http://www.wikidata.org/entity/Q5'.
+    # faster than uri.split('/')[-1] as no list is built
+    return uri.rpartition('/')[2]
+
+
 class FastRunContainer(object):
     def __init__(self, base_data_type, engine, mediawiki_api_url=None, sparql_endpoint_url=None, wikibase_url=None,
                  concept_base_uri=None, base_filter=None, use_refs=False, ref_handler=None, case_insensitive=False,
@@ -40,49 +48,78 @@ class FastRunContainer(object):
         self.reconstructed_statements = []
         self.use_refs = use_refs
         self.ref_handler = ref_handler
+        self._dtype_cls_cache = {}
+        # datatypes of props that were looked up without querying their data, e.g. qualifier and reference props.
+        # kept out of prop_dt_map, which also records which props have had their data queried
+        self._prop_dt_cache = {}
+        self.refresh_dtypes()
 
         if base_filter and any(base_filter):
             self.base_filter = base_filter
 
-            for k, v in self.base_filter.items():
-                if v:
-                    self.base_filter_string += '?item wdt:{0} wd:{1} . \n'.format(k, v)
-                else:
-                    self.base_filter_string += '?item wdt:{0} ?zz . \n'.format(k)
+            self.base_filter_string = ''.join(
+                '?item wdt:{0} wd:{1} . \n'.format(k, v) if v else '?item wdt:{0} ?zz . \n'.format(k)
+                for k, v in self.base_filter.items())
+
+    def refresh_dtypes(self):
+        """
+        Build the map of wikibase datatype -> subclass of `base_data_type` used to reconstruct statements.
+        This is done when the container is created, calling it again is only needed to pick up datatype classes
+        defined after that
+        """
+        dtype_cls = {}
+        for x in self.base_data_type.__subclasses__():
+            dtype_cls.setdefault(x.DTYPE, x)
+        self._dtype_cls_cache = dtype_cls
+
+    def _cls_for_dtype(self, dtype):
+        """
+        Get the subclass of `base_data_type` implementing the wikibase datatype `dtype`.
+        """
+        cls = self._dtype_cls_cache.get(dtype)
+        if cls is None:
+            # the class may have been defined after the map was built
+            self.refresh_dtypes()
+            cls = self._dtype_cls_cache[dtype]
+        return cls
 
     def reconstruct_statements(self, qid):
         reconstructed_statements = []
         if qid not in self.prop_data:
             self.reconstructed_statements = reconstructed_statements
             return reconstructed_statements
+        # collect the qualifier and reference props of all statements first, so their datatypes can be fetched at once
+        missing_props = set()
         for prop_nr, dt in self.prop_data[qid].items():
             # get datatypes for qualifier props
-            q_props = set(chain(*[[x[0] for x in d['qual']] for d in dt.values()]))
-            r_props = set(chain(*[set(chain(*[[y[0] for y in x] for x in d['ref'].values()])) for d in dt.values()]))
-            props = q_props | r_props
-            for prop in props:
-                if prop not in self.prop_dt_map:
-                    self.prop_dt_map.update({prop: self.get_prop_datatype(prop)})
+            q_props = {x[0] for d in dt.values() for x in d['qual']}
+            r_props = {y[0] for d in dt.values() for x in d['ref'].values() for y in x}
+            missing_props.update((q_props | r_props) - self.prop_dt_map.keys() - self._prop_dt_cache.keys())
+        if missing_props:
+            self._prop_dt_cache.update(self._bulk_prop_datatypes(missing_props))
+
+        # local names for the lookups done for every statement, qualifier and reference below
+        prop_dt_map = self.prop_dt_map
+        get_prop_datatype = self.get_prop_datatype
+        cls_for_dtype = self._cls_for_dtype
+        for prop_nr, dt in self.prop_data[qid].items():
             # reconstruct statements from frc (including qualifiers, and refs)
+            f = cls_for_dtype(prop_dt_map[prop_nr])
             for uid, d in dt.items():
                 qualifiers = []
                 for q in d['qual']:
-                    f = [x for x in self.base_data_type.__subclasses__() if x.DTYPE ==
-                         self.prop_dt_map[q[0]]][0]
-                    qualifiers.append(f(q[1], prop_nr=q[0], is_qualifier=True))
+                    qf = cls_for_dtype(get_prop_datatype(q[0]))
+                    qualifiers.append(qf(q[1], prop_nr=q[0], is_qualifier=True))
 
                 references = []
                 for ref_id, refs in d['ref'].items():
                     this_ref = []
                     for ref in refs:
-                        f = [x for x in self.base_data_type.__subclasses__() if x.DTYPE ==
-                             self.prop_dt_map[ref[0]]][0]
-                        this_ref.append(f(ref[1], prop_nr=ref[0], is_reference=True))
+                        rf = cls_for_dtype(get_prop_datatype(ref[0]))
+                        this_ref.append(rf(ref[1], prop_nr=ref[0], is_reference=True))
                     references.append(this_ref)
 
-                f = [x for x in self.base_data_type.__subclasses__() if x.DTYPE ==
-                     self.prop_dt_map[prop_nr]][0]
-                if self.prop_dt_map[prop_nr] == 'quantity' and d['unit'] != '1':
+                if prop_dt_map[prop_nr] == 'quantity' and d['unit'] != '1':
                     reconstructed_statements.append(
                         f(d['v'], prop_nr=prop_nr, qualifiers=qualifiers, references=references, unit=d['unit'],
                           concept_base_uri=self.concept_base_uri))
@@ -96,6 +133,15 @@ class FastRunContainer(object):
 
     def load_item(self, data, cqid=None):
         match_sets = []
+        # get the datatypes and the data for all props that have never been seen before at once
+        new_props = {date.get_prop_nr() for date in data if date.get_value() or date.data_type} - \
+            self.prop_dt_map.keys()
+        if new_props:
+            if self.debug:
+                print("{} not found in fastrun".format(sorted(new_props)))
+            self.prop_dt_map.update(self._bulk_prop_datatypes(new_props))
+            self._query_data_bulk(new_props)
+
         for date in data:
             # skip to next if statement has no value or no data type defined, e.g. for deletion objects
             current_value = date.get_value()
@@ -104,12 +150,6 @@ class FastRunContainer(object):
 
             prop_nr = date.get_prop_nr()
 
-            if prop_nr not in self.prop_dt_map:
-                if self.debug:
-                    print("{} not found in fastrun".format(prop_nr))
-                self.prop_dt_map.update({prop_nr: self.get_prop_datatype(prop_nr)})
-                self._query_data(prop_nr)
-
             # more sophisticated data types like dates and globe coordinates need special treatment here
             if self.prop_dt_map[prop_nr] == 'time':
                 current_value = current_value[0]
@@ -123,9 +163,9 @@ class FastRunContainer(object):
 
             if current_value in self.rev_lookup:
                 # quick check for if the value has ever been seen before, if not, write required
-                temp_set = set(self.rev_lookup[current_value])
+                temp_set = self.rev_lookup[current_value]
             elif self.case_insensitive and current_value.casefold() in self.rev_lookup_ci:
-                temp_set = set(self.rev_lookup_ci[current_value.casefold()])
+                temp_set = self.rev_lookup_ci[current_value.casefold()]
             else:
                 if self.debug:
                     if self.case_insensitive:
@@ -140,7 +180,14 @@ class FastRunContainer(object):
         if cqid:
             matching_qids = {cqid}
         else:
-            matching_qids = match_sets[0].intersection(*match_sets[1:])
+            # intersect starting with the smallest set so the intermediate results stay small,
+            # and stop as soon as there is no qid left
+            match_sets.sort(key=len)
+            matching_qids = set(match_sets[0])
+            for match_set in match_sets[1:]:
+                if not matching_qids:
+                    break
+                matching_qids &= match_set
 
         # check if there are any items that have all of these values
         # if not, a write is required no matter what
@@ -153,6 +200,7 @@ class FastRunContainer(object):
         self.current_qid = qid
 
     def write_required(self, data, append_props=None, cqid=None):
+        debug = self.debug
         del_props = set()
         data_props = set()
         if not append_props:
@@ -164,8 +212,17 @@ class FastRunContainer(object):
         write_required = False
         self.load_item(data, cqid)
 
-        reconstructed_statements = self.reconstruct_statements(self.current_qid)
-        tmp_rs = copy.deepcopy(reconstructed_statements)
+        # reconstruct_statements builds new statement objects on every call, so there is no need to copy them
+        tmp_rs = self.reconstruct_statements(self.current_qid)
+
+        # how statements are compared is the same for the whole call, so pick the comparison once.
+        # without refs, x.equals(y) is the same as x == y
+        use_refs = self.use_refs
+        ref_handler = self.ref_handler if use_refs else None
+        if use_refs:
+            statements_equal = lambda x, y: x.equals(y, include_ref=True)
+        else:
+            statements_equal = operator.eq
 
         # handle append properties
         for p in append_props:
@@ -175,86 +232,85 @@ class FastRunContainer(object):
             for x in app_data:
                 for y in rec_app_data:
                     if x.get_value() == y.get_value():
-                        if self.use_refs and self.ref_handler:
+                        if ref_handler:
                             to_be = copy.deepcopy(y)
-                            self.ref_handler(to_be, x)
+                            ref_handler(to_be, x)
                         else:
                             to_be = x
-                        if y.equals(to_be, include_ref=self.use_refs):
+                        if statements_equal(y, to_be):
                             comp.append(True)
 
             # comp = [True for x in app_data for y in rec_app_data if x.equals(y, include_ref=self.use_refs)]
             if len(comp) != len(app_data):
-                if self.debug:
+                if debug:
                     print("failed append: {}".format(p))
                 return True
 
-        tmp_rs = [x for x in tmp_rs if x.get_prop_nr() not in append_props and x.get_prop_nr() in data_props]
+        # a statement can only be equal to a statement with the same property, so group the reconstructed
+        # statements by property and only compare against the statements for that property
+        tmp_rs_by_prop = defaultdict(list)
+        num_remaining = 0
+        for x in tmp_rs:
+            x_prop_nr = x.get_prop_nr()
+            if x_prop_nr not in append_props and x_prop_nr in data_props:
+                tmp_rs_by_prop[x_prop_nr].append(x)
+                num_remaining += 1
 
         for date in data:
+            date_prop_nr = date.get_prop_nr()
+            candidates = tmp_rs_by_prop[date_prop_nr]
             # ensure that statements meant for deletion get handled properly
-            reconst_props = set([x.get_prop_nr() for x in tmp_rs])
-            if (not date.value or not date.data_type) and date.get_prop_nr() in reconst_props:
-                if self.debug:
+            if (not date.value or not date.data_type) and candidates:
+                if debug:
                     print('returned from delete prop handling')
                 return True
             elif not date.value or not date.data_type:
                 # Ignore the deletion statements which are not in the reconstructed statements.
                 continue
 
-            if date.get_prop_nr() in append_props:
+            if date_prop_nr in append_props:
                 continue
 
             if not date.get_value() and not date.data_type:
-                del_props.add(date.get_prop_nr())
+                del_props.add(date_prop_nr)
 
             # this is where the magic happens
             # date is a new statement, proposed to be written
-            # tmp_rs are the reconstructed statements == current state of the item
-            bool_vec = []
-            for x in tmp_rs:
-                if (x.get_value() == date.get_value() or (
-                        self.case_insensitive and x.get_value().casefold() == date.get_value().casefold())) and x.get_prop_nr() not in del_props:
-                    if self.use_refs and self.ref_handler:
+            # candidates are the reconstructed statements for this property == current state of the item
+            # all candidates have the same prop as date
+            match_idx = None
+            for idx, x in enumerate(candidates if date_prop_nr not in del_props else []):
+                if x.get_value() == date.get_value() or (
+                        self.case_insensitive and x.get_value().casefold() == date.get_value().casefold()):
+                    if ref_handler:
                         to_be = copy.deepcopy(x)
-                        self.ref_handler(to_be, date)
+                        ref_handler(to_be, date)
                     else:
                         to_be = date
-                    if x.equals(to_be, include_ref=self.use_refs):
-                        bool_vec.append(True)
-                    else:
-                        bool_vec.append(False)
-                else:
-                    bool_vec.append(False)
-            """
-            bool_vec = [x.equals(date, include_ref=self.use_refs, fref=self.ref_comparison_f) and
-            x.get_prop_nr() not in del_props for x in tmp_rs]
-            """
+                    if statements_equal(x, to_be):
+                        match_idx = idx
+                        break
 
-            if self.debug:
-                print("bool_vec: {}".format(bool_vec))
+            if debug:
+                print("match index: {}".format(match_idx))
                 print('-----------------------------------')
-                for x in tmp_rs:
-                    if date == x and x.get_prop_nr() not in del_props:
-                        print(x.get_prop_nr(), x.get_value(), [z.get_value() for z in x.get_qualifiers()])
-                        print(date.get_prop_nr(), date.get_value(), [z.get_value() for z in date.get_qualifiers()])
-                    else:
-                        if x.get_prop_nr() == date.get_prop_nr():
-                            print(x.get_prop_nr(), x.get_value(), [z.get_value() for z in x.get_qualifiers()])
-                            print(date.get_prop_nr(), date.get_value(), [z.get_value() for z in date.get_qualifiers()])
-
-            if not any(bool_vec):
-                if self.debug:
-                    print(len(bool_vec))
-                    print('fast run failed at', date.get_prop_nr())
+                for x in candidates:
+                    print(x.get_prop_nr(), x.get_value(), [z.get_value() for z in x.get_qualifiers()])
+                    print(date_prop_nr, date.get_value(), [z.get_value() for z in date.get_qualifiers()])
+
+            if match_idx is None:
+                if debug:
+                    print(len(candidates))
+                    print('fast run failed at', date_prop_nr)
                 write_required = True
             else:
-                tmp_rs.pop(bool_vec.index(True))
+                candidates.pop(match_idx)
+                num_remaining -= 1
 
-        if len(tmp_rs) > 0:
-            if self.debug:
+        if num_remaining > 0:
+            if debug:
                 print('failed because not zero')
-                for x in tmp_rs:
+                for x in chain.from_iterable(tmp_rs_by_prop.values()):
                     print('xxx', x.get_prop_nr(), x.get_value(), [z.get_value() for z in x.get_qualifiers()])
                 print('failed because not zero--END')
             write_required = True
@@ -334,54 +390,79 @@ class FastRunContainer(object):
             unit: property unit
         """
         prop_dt = self.get_prop_datatype(prop_nr)
+        self._prefetch_result_datatypes(r)
+        items_by_value = defaultdict(list)
         for i in r:
-            for value in {'item', 'sid', 'pq', 'pr', 'ref', 'unit'}:
-                if value in i:
-                    # these are always URIs for the local wikibase
-                    i[value] = i[value]['value'].split('/')[-1]
-
-            # make sure datetimes are formatted correctly.
-            # the correct format is '+%Y-%m-%dT%H:%M:%SZ', but is sometimes missing the plus??
-            # some difference between RDF and xsd:dateTime that I don't understand
-            for value in {'v', 'qval', 'rval'}:
-                if value in i:
-                    if i[value].get("datatype") == 'http://www.w3.org/2001/XMLSchema#dateTime' and not \
-                            i[value]['value'][0] in '+-':
-                        # if it is a dateTime and doesn't start with plus or minus, add a plus
-                        i[value]['value'] = '+' + i[value]['value']
-
-            # these three ({'v', 'qval', 'rval'}) are values that can be any data type
-            # strip off the URI if they are wikibase-items
-            if 'v' in i:
-                if i['v']['type'] == 'uri' and prop_dt == 'wikibase-item':
-                    i['v'] = i['v']['value'].split('/')[-1]
-                elif i['v']['type'] == 'literal' and prop_dt == 'quantity':
-                    i['v'] = self.format_amount(i['v']['value'])
-                else:
-                    i['v'] = i['v']['value']
-
-                # Note: no-value and some-value don't actually show up in the results here
-                # see for example: select * where { wd:Q7207 p:P40 ?c . ?c ?d ?e }
-                if type(i['v']) is not dict:
-                    self.rev_lookup[i['v']].add(i['item'])
-                    if self.case_insensitive:
-                        self.rev_lookup_ci[i['v'].casefold()].add(i['item'])
+            self._format_query_result(i, prop_dt)
+            if 'v' in i and type(i['v']) is not dict:
+                items_by_value[i['v']].append(i['item'])
+        self._update_rev_lookup(items_by_value)
+
+    def _format_query_result(self, i, prop_dt):
+        # format a single result of the sparql query in place. see format_query_results
+        # the result is added to rev_lookup separately, see _update_rev_lookup
+        for value in {'item', 'sid', 'pq', 'pr', 'ref', 'unit'}:
+            if value in i:
+                # these are always URIs for the local wikibase
+                i[value] = _local_name(i[value]['value'])
+                if value in {'item', 'pq', 'pr', 'unit'}:
+                    # item and property ids are repeated across many rows and statements. interning them
+                    # shares one string object per id and lets dict and set lookups compare by identity
+                    i[value] = sys.intern(i[value])
+
+        # make sure datetimes are formatted correctly.
+        # the correct format is '+%Y-%m-%dT%H:%M:%SZ', but is sometimes missing the plus??
+        # some difference between RDF and xsd:dateTime that I don't understand
+        for value in {'v', 'qval', 'rval'}:
+            if value in i:
+                if i[value].get("datatype") == 'http://www.w3.org/2001/XMLSchema#dateTime' and not \
+                        i[value]['value'][0] in '+-':
+                    # if it is a dateTime and doesn't start with plus or minus, add a plus
+                    i[value]['value'] = '+' + i[value]['value']
+
+        # these three ({'v', 'qval', 'rval'}) are values that can be any data type
+        # strip off the URI if they are wikibase-items
+        if 'v' in i:
+            if i['v']['type'] == 'uri' and prop_dt == 'wikibase-item':
+                i['v'] = sys.intern(_local_name(i['v']['value']))
+            elif i['v']['type'] == 'literal' and prop_dt == 'quantity':
+                i['v'] = self.format_amount(i['v']['value'])
+            else:
+                i['v'] = i['v']['value']
 
-            # handle qualifier value
-            if 'qval' in i:
-                qual_prop_dt = self.get_prop_datatype(prop_nr=i['pq'])
-                if i['qval']['type'] == 'uri' and qual_prop_dt == 'wikibase-item':
-                    i['qval'] = i['qval']['value'].split('/')[-1]
-                else:
-                    i['qval'] = i['qval']['value']
+        # handle qualifier value
+        if 'qval' in i:
+            qual_prop_dt = self.get_prop_datatype(prop_nr=i['pq'])
+            if i['qval']['type'] == 'uri' and qual_prop_dt == 'wikibase-item':
+                i['qval'] = sys.intern(_local_name(i['qval']['value']))
+            else:
+                i['qval'] = i['qval']['value']
 
-            # handle reference value
-            if 'rval' in i:
-                ref_prop_dt = self.get_prop_datatype(prop_nr=i['pr'])
-                if i['rval']['type'] == 'uri' and ref_prop_dt == 'wikibase-item':
-                    i['rval'] = i['rval']['value'].split('/')[-1]
-                else:
-                    i['rval'] = i['rval']['value']
+        # handle reference value
+        if 'rval' in i:
+            ref_prop_dt = self.get_prop_datatype(prop_nr=i['pr'])
+            if i['rval']['type'] == 'uri' and ref_prop_dt == 'wikibase-item':
+                i['rval'] = sys.intern(_local_name(i['rval']['value']))
+            else:
+                i['rval'] = i['rval']['value']
+
+    def _prefetch_result_datatypes(self, r):
+        # get the datatypes of all qualifier and reference props in the (unformatted) query results `r` at once,
+        # so formatting the results doesn't load them one property at a time
+        props = {_local_name(i[k]['value']) for i in r for k in ('pq', 'pr') if k in i}
+        missing_props = props - self.prop_dt_map.keys() - self._prop_dt_cache.keys()
+        if missing_props:
+            self._prop_dt_cache.update(self._bulk_prop_datatypes(missing_props))
+
+    def _update_rev_lookup(self, items_by_value):
+        # `items_by_value` maps statement values to the items they were found on, collected from the formatted results.
+        # Note: no-value and some-value don't actually show up in the results here
+        # see for example: select * where { wd:Q7207 p:P40 ?c . ?c ?d ?e }
+        # rev_lookup is updated once per value instead of once per result
+        for v, items in items_by_value.items():
+            self.rev_lookup[v].update(items)
+            if self.case_insensitive:
+                self.rev_lookup_ci[v.casefold()].update(items)
 
     def format_amount(self, amount):
         # Remove .0 by casting to int
@@ -399,33 +480,38 @@ class FastRunContainer(object):
         # r is the output of format_query_results
         # this updates the frc from the query (result of _query_data)
         for i in r:
-            qid = i['item']
-            if qid not in self.prop_data:
-                self.prop_data[qid] = {prop_nr: dict()}
-            if prop_nr not in self.prop_data[qid]:
-                self.prop_data[qid].update({prop_nr: dict()})
-            if i['sid'] not in self.prop_data[qid][prop_nr]:
-                self.prop_data[qid][prop_nr].update({i['sid']: dict()})
+            self._update_frc_from_result(i, prop_nr)
+
+    def _update_frc_from_result(self, i, prop_nr):
+        # add a single formatted result to the frc. see update_frc_from_query
+        statements = self.prop_data.setdefault(i['item'], {}).setdefault(prop_nr, {})
+        d = statements.get(i['sid'])
+        if d is None:
+            d = statements[i['sid']] = {'v': i['v'], 'qual': set(), 'ref': dict(), 'unit': '1'}
+        else:
             # update values for this statement (not including ref)
-            d = {'v': i['v']}
-            self.prop_data[qid][prop_nr][i['sid']].update(d)
-
-            if 'qual' not in self.prop_data[qid][prop_nr][i['sid']]:
-                self.prop_data[qid][prop_nr][i['sid']]['qual'] = set()
-            if 'pq' in i and 'qval' in i:
-                self.prop_data[qid][prop_nr][i['sid']]['qual'].add((i['pq'], i['qval']))
-
-            if 'ref' not in self.prop_data[qid][prop_nr][i['sid']]:
-                self.prop_data[qid][prop_nr][i['sid']]['ref'] = dict()
-            if 'ref' in i:
-                if i['ref'] not in self.prop_data[qid][prop_nr][i['sid']]['ref']:
-                    self.prop_data[qid][prop_nr][i['sid']]['ref'][i['ref']] = set()
-                self.prop_data[qid][prop_nr][i['sid']]['ref'][i['ref']].add((i['pr'], i['rval']))
-
-            if 'unit' not in self.prop_data[qid][prop_nr][i['sid']]:
-                self.prop_data[qid][prop_nr][i['sid']]['unit'] = '1'
-            if 'unit' in i:
-                self.prop_data[qid][prop_nr][i['sid']]['unit'] = i['unit']
+            d['v'] = i['v']
+
+        if 'pq' in i and 'qval' in i:
+            d['qual'].add((i['pq'], i['qval']))
+
+        if 'ref' in i:
+            d['ref'].setdefault(i['ref'], set()).add((i['pr'], i['rval']))
+
+        if 'unit' in i:
+            d['unit'] = i['unit']
+
+    def _process_query_results(self, r, prop_nr):
+        # format the results of a _query_data query and add them to the frc, in a single pass over the results
+        prop_dt = self.get_prop_datatype(prop_nr)
+        self._prefetch_result_datatypes(r)
+        items_by_value = defaultdict(list)
+        for i in r:
+            self._format_query_result(i, prop_dt)
+            self._update_frc_from_result(i, prop_nr)
+            if 'v' in i and type(i['v']) is not dict:
+                items_by_value[i['v']].append(i['item'])
+        self._update_rev_lookup(items_by_value)
 
     def _query_data_refs(self, prop_nr):
         page_size = 10000
@@ -486,8 +572,7 @@ class FastRunContainer(object):
                 print(query)
 
             results = self.engine.execute_sparql_query(query, endpoint=self.sparql_endpoint_url)['results']['bindings']
-            self.format_query_results(results, prop_nr)
-            self.update_frc_from_query(results, prop_nr)
+            self._process_query_results(results, prop_nr)
             page_count += 1
             if num_pages:
                 print("Query {}: {}/{}".format(prop_nr, page_count, num_pages))
@@ -526,8 +611,55 @@ class FastRunContainer(object):
                 print(query)
 
             r = self.engine.execute_sparql_query(query=query, endpoint=self.sparql_endpoint_url)['results']['bindings']
-            self.format_query_results(r, prop_nr)
-            self.update_frc_from_query(r, prop_nr)
+            self._process_query_results(r, prop_nr)
+
+    def _query_data_bulk(self, prop_nrs):
+        """
+        Query the data for several props with one query, instead of one query per prop.
+        With use_refs, the data is paged per prop by _query_data_refs
+        :param prop_nrs: property ids
+        """
+        prop_nrs = sorted(prop_nrs)
+        if self.use_refs or len(prop_nrs) == 1:
+            for prop_nr in prop_nrs:
+                self._query_data(prop_nr)
+            return
+
+        query = '''
+            PREFIX wd: <{0}/entity/>
+            PREFIX wdt: <{0}/prop/direct/>
+            PREFIX p: <{0}/prop/>
+            PREFIX ps: <{0}/prop/statement/>
+            PREFIX psv: <{0}/prop/statement/value/>
+            #Tool: wdi_core fastrun
+            select ?p ?item ?qval ?pq ?sid ?v ?unit where {{
+              {1}
+              VALUES (?p ?ps ?psv) {{ {2} }}
+
+              ?item ?p ?sid .
+
+              ?sid ?ps ?v .
+              OPTIONAL {{
+                ?sid ?pq ?qval .
+                [] wikibase:qualifier ?pq
+              }}
+              OPTIONAL {{
+                ?sid ?psv ?valuenode .
+                ?valuenode wikibase:quantityUnit ?unit
+              }}
+            }}
+            '''.format(self.wikibase_url, self.base_filter_string,
+                       ' '.join('(p:{0} ps:{0} psv:{0})'.format(prop_nr) for prop_nr in prop_nrs))
+
+        if self.debug:
+            print(query)
+
+        r = self.engine.execute_sparql_query(query=query, endpoint=self.sparql_endpoint_url)['results']['bindings']
+        results_by_prop = defaultdict(list)
+        for i in r:
+            results_by_prop[_local_name(i.pop('p')['value'])].append(i)
+        for prop_nr, prop_results in results_by_prop.items():
+            self._process_query_results(prop_results, prop_nr)
 
     def _query_lang(self, lang, lang_data_type):
         """
@@ -567,13 +699,44 @@ class FastRunContainer(object):
     def _process_lang(result):
         data = defaultdict(set)
         for r in result:
-            qid = r['item']['value'].split("/")[-1]
+            qid = _local_name(r['item']['value'])
             if 'label' in r:
                 data[qid].add(r['label']['value'])
         return data
 
+    def _bulk_prop_datatypes(self, prop_nrs):
+        """
+        Get the datatypes for several properties, using one api request per 50 properties
+        :param prop_nrs: property ids
+        :return: dict of property id -> datatype
+        """
+        prop_nrs = sorted(prop_nrs)
+        prop_dts = dict()
+        for n in range(0, len(prop_nrs), 50):
+            params = {
+                'action': 'wbgetentities',
+                'ids': '|'.join(prop_nrs[n:n + 50]),
+                'props': 'datatype',
+                'format': 'json'
+            }
+            headers = {
+                'User-Agent': config['USER_AGENT_DEFAULT']
+            }
+            json_data = self.engine.mediawiki_api_call("GET", self.mediawiki_api_url, params=params, headers=headers)
+            prop_dts.update({k: v['datatype'] for k, v in json_data['entities'].items() if 'datatype' in v})
+        for prop_nr in prop_nrs:
+            if prop_nr not in prop_dts:
+                # let get_prop_datatype deal with anything that didn't come back
+                prop_dts[prop_nr] = self.get_prop_datatype(prop_nr)
+        return prop_dts
+
     @lru_cache(maxsize=100000)
     def get_prop_datatype(self, prop_nr):
+        # already known, e.g. from _bulk_prop_datatypes
+        if prop_nr in self.prop_dt_map:
+            return self.prop_dt_map[prop_nr]
+        if prop_nr in self._prop_dt_cache:
+            return self._prop_dt_cache[prop_nr]
         item = self.engine(wd_item_id=prop_nr, sparql_endpoint_url=self.sparql_endpoint_url,
                            mediawiki_api_url=self.mediawiki_api_url,
                            wikibase_url=self.wikibase_url)
@@ -584,9 +747,11 @@ class FastRunContainer(object):
         convinience function to empty this fastrun container
         """
         self.prop_dt_map = dict()
+        self._prop_dt_cache = dict()
         self.prop_data = dict()
         self.rev_lookup = defaultdict(set)
         self.rev_lookup_ci = defaultdict(set)
+        self.refresh_dtypes()
 
     """A mixin implementing a simple __repr__."""
 
@@ -148,7 +148,7 @@ def prop2qid(prop, value, endpoint='https://query.wikidata.org/sparql'):
 
 
 def id_mapper(prop, filters=None, raise_on_duplicate=False, return_as_set=False, prefer_exact_match=False,
-              endpoint='https://query.wikidata.org/sparql'):
+              endpoint='https://query.wikidata.org/sparql', session=None):
     """
     Get all wikidata ID <-> prop <-> value mappings
     Example: id_mapper("P352") -> { 'A0KH68': 'Q23429083',
@@ -172,6 +172,8 @@ def id_mapper(prop, filters=None, raise_on_duplicate=False, return_as_set=False,
     an exactMatch qualifier, all will be returned. If multiple has 'exactMatch', they will not be discarded.
     https://www.wikidata.org/wiki/Property:P4390
     :type prefer_exact_match: bool
+    :param session: (optional) requests session used for the query. see WDItemEngine.execute_sparql_query
+    :type session: requests.Session
 
 
     If `raise_on_duplicate` is False and `return_as_set` is True, the following can be returned:
@@ -187,7 +189,8 @@ def id_mapper(prop, filters=None, raise_on_duplicate=False, return_as_set=False,
         for f in filters:
             query += "?item wdt:{} wd:{} .\n".format(f[0], f[1])
     query = query + "}"
-    results = wdi_core.WDItemEngine.execute_sparql_query(query, endpoint=endpoint)['results']['bindings']
+    results = wdi_core.WDItemEngine.execute_sparql_query(query, endpoint=endpoint,
+                                                         session=session)['results']['bindings']
     results = [{k: v['value'] for k, v in x.items()} for x in results]
     for r in results:
         r['item'] = r['item'].split('/')[-1]
@@ -1,9 +1,23 @@
 import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 from wikidataintegrator import wdi_core
 from wikidataintegrator.wdi_helpers import id_mapper, try_write
 from wikidataintegrator.wdi_helpers.wikibase_helper import WikibaseHelper
 
+# cached in Release._release_cache for releases that were looked up and don't exist
+_MISS = object()
+
+
+@lru_cache(maxsize=8)
+def _helper_for(sparql_endpoint_url, session=None):
+    # WikibaseHelper queries the endpoint for its pid/qid maps when created and is read-only afterwards,
+    # so all releases on the same endpoint share one
+    return WikibaseHelper(sparql_endpoint_url, session=session)
+
 
 class Release(object):
     """
@@ -27,12 +41,23 @@ class Release(object):
     r.get_or_create(login)
 
     """
-    # dict. key is a tuple of (sparql_endpoint_url, edition_of_qid, edition), value is the qid of that release
+    # dict. key is a tuple of (sparql_endpoint_url, edition_of_qid, edition), value is the qid of that release,
+    # or _MISS if the release was not found by a get_or_create call without a login
     _release_cache = dict()
+    # dict. key is a tuple of (sparql_endpoint_url, edition_of_qid), value is a tuple of (time.monotonic() of the query,
+    # dict of edition -> qid of all releases of edition_of_qid)
+    _edition_dict_cache = dict()
+    # number of seconds that the releases in _edition_dict_cache are used for before querying again
+    edition_dict_cache_ttl = 300
+    # a release is looked up or created while holding one of these locks, picked by its _release_cache key, so that
+    # concurrent get_or_create calls for the same release wait for the first one instead of creating it twice
+    _key_locks = tuple(threading.Lock() for _ in range(64))
+    # held while changing the cached releases from several threads
+    _cache_lock = threading.Lock()
 
     def __init__(self, title, description, edition, edition_of_wdid, archive_url=None,
                  pub_date=None, date_precision=11, mediawiki_api_url='https://www.wikidata.org/w/api.php',
-                 sparql_endpoint_url='https://query.wikidata.org/sparql'):
+                 sparql_endpoint_url='https://query.wikidata.org/sparql', session=None):
         """
 
         :param title: title of release item
@@ -49,10 +74,14 @@ class Release(object):
         :type pub_date: str or datetime
         :param date_precision: (optional) passed to PBB_Core.WDTime as is. default is 11 (day)
         :type date_precision: int
+        :param session: (optional) requests session used for all sparql queries. Pass the same session to many
+            releases to reuse the connection to the sparql endpoint
+        :type session: requests.Session
         """
         self.title = title
         self.description = description
-        self.edition = str(edition)
+        # stripped so that the same edition always gives the same cache key
+        self.edition = str(edition).strip()
         self.archive_url = archive_url
         if isinstance(pub_date, datetime.date):
             self.pub_date = pub_date.strftime('+%Y-%m-%dT%H:%M:%SZ')
@@ -62,7 +91,8 @@ class Release(object):
         self.edition_of_qid = edition_of_wdid
         self.sparql_endpoint_url = sparql_endpoint_url
         self.mediawiki_api_url = mediawiki_api_url
-        self.helper = WikibaseHelper(sparql_endpoint_url)
+        self.session = session
+        self.helper = _helper_for(sparql_endpoint_url, session=session)
 
         self.statements = None
 
@@ -85,47 +115,162 @@ class Release(object):
         self.statements = s
 
     def get_or_create(self, login=None):
+        return self._get_or_create(login, time.monotonic())
+
+    def _get_or_create(self, login, checked_since):
+        # a release is only created if it wasn't found by a query made after checked_since (a time.monotonic() value)
 
         # check in cache
         key = (self.sparql_endpoint_url, self.edition_of_qid, self.edition)
-        if key in self._release_cache:
-            return self._release_cache[key]
+        qid = self._release_cache.get(key)
+        if qid is not None and qid is not _MISS:
+            return qid
+        if qid is _MISS and login is None:
+            raise ValueError("login required to create item")
 
-        # check in wikidata
-        # edition number, filter by edition of and instance of edition
-        helper = self.helper
-        edition_dict = id_mapper(helper.get_pid("P393"),
-                                 ((helper.get_pid("P629"), self.edition_of_qid),
-                                  (helper.get_pid("P31"), helper.get_qid("Q3331189"))),
-                                 endpoint=self.sparql_endpoint_url)
-        if edition_dict and self.edition in edition_dict:
-            # add to cache
-            self._release_cache[key] = edition_dict[self.edition]
-            return edition_dict[self.edition]
+        with self._lock_for(key):
+            # another thread may have looked up or created this release while we were waiting
+            qid = self._release_cache.get(key)
+            if qid is not None and qid is not _MISS:
+                return qid
 
-        # create new
-        if login is None:
-            raise ValueError("login required to create item")
+            # check in wikidata
+            edition_dict = self._get_edition_dict(self.helper, self.edition_of_qid, session=self.session)
+            if login is not None and not (edition_dict and self.edition in edition_dict):
+                # a cached query can be older than a release that was created by someone else since
+                edition_dict = self._get_edition_dict(self.helper, self.edition_of_qid, session=self.session,
+                                                      checked_since=checked_since)
+            if edition_dict and self.edition in edition_dict:
+                # add to cache
+                qid = self._release_cache[key] = edition_dict[self.edition]
+                return qid
 
-        self.make_statements()
-        item = wdi_core.WDItemEngine(data=self.statements,
-                                     mediawiki_api_url=self.mediawiki_api_url,
-                                     sparql_endpoint_url=self.sparql_endpoint_url)
-        item.set_label(self.title)
-        item.set_description(description=self.description, lang='en')
-        write_success = try_write(item, self.edition + "|" + self.edition_of_qid, 'P393|P629', login)
-        if write_success:
+            # create new
+            if login is None:
+                # remember that it doesn't exist, so calls without a login don't query again
+                self._release_cache[key] = _MISS
+                raise ValueError("login required to create item")
+
+            self.make_statements()
+            item = wdi_core.WDItemEngine(data=self.statements,
+                                         mediawiki_api_url=self.mediawiki_api_url,
+                                         sparql_endpoint_url=self.sparql_endpoint_url)
+            item.set_label(self.title)
+            item.set_description(description=self.description, lang='en')
+            write_success = try_write(item, self.edition + "|" + self.edition_of_qid, 'P393|P629', login)
+            # try_write returns the exception it caught instead of raising it, and exceptions are truthy
+            if write_success is not True:
+                raise write_success
             # add to cache
             self._release_cache[key] = item.wd_item_id
+            self._add_to_edition_dict_cache(self.sparql_endpoint_url, self.edition_of_qid, self.edition,
+                                            item.wd_item_id)
             return item.wd_item_id
-        else:
-            raise write_success
 
     def get_all_releases(self):
         # helper function to get all releases for the edition_of_qid given
-        helper = self.helper
+        edition_dict = self._get_edition_dict(self.helper, self.edition_of_qid, session=self.session)
+        return dict(edition_dict) if edition_dict is not None else None
+
+    @classmethod
+    def preload_cache(cls, edition_of_wdid, sparql_endpoint_url='https://query.wikidata.org/sparql', session=None):
+        """
+        Look up all releases of a database with one query and add them to the release cache, so that get_or_create
+        doesn't query again for any of them. Useful before getting or creating many releases of the same database
+
+        :param edition_of_wdid: wikidata qid of database to get the releases of
+        :type edition_of_wdid: str
+        :param sparql_endpoint_url: (optional)
+        :type sparql_endpoint_url: str
+        :param session: (optional) requests session used for the queries
+        :type session: requests.Session
+        :return: dict of edition -> qid of all releases found
+        """
+        helper = _helper_for(sparql_endpoint_url, session=session)
+        # always query, so the releases are current
+        edition_dict = cls._get_edition_dict(helper, edition_of_wdid, session=session,
+                                             checked_since=time.monotonic()) or dict()
+        for edition, qid in edition_dict.items():
+            cls._release_cache[(sparql_endpoint_url, edition_of_wdid, edition)] = qid
+        return dict(edition_dict)
+
+    @classmethod
+    def bulk_get_or_create(cls, releases, login=None, max_workers=4):
+        """
+        Get or create many releases, running up to max_workers get_or_create calls at once. The releases of each
+        database are looked up first with one query per database. Releases that aren't found there are created without
+        being looked up again, so the workers only spend time on writes
+
+        :param releases: Release instances
+        :type releases: iterable
+        :param login: (optional) wdi_login object, required if any release has to be created
+        :param max_workers: number of releases to get or create at the same time. Keep this small, mediawiki limits
+            the edit rate per user
+        :type max_workers: int
+        :return: list of the qids of the releases, in the same order as releases. Raises the first error raised by
+            get_or_create, e.g. the wdi_core.WDApiError of a failed write
+        """
+        releases = list(releases)
+        checked_since = time.monotonic()
+        databases = {(r.sparql_endpoint_url, r.edition_of_qid): r.session for r in releases}
+        for (sparql_endpoint_url, edition_of_qid), session in databases.items():
+            cls.preload_cache(edition_of_qid, sparql_endpoint_url=sparql_endpoint_url, session=session)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(lambda r: r._get_or_create(login, checked_since), releases))
+
+    @classmethod
+    def invalidate(cls, edition_of_wdid, edition=None, sparql_endpoint_url='https://query.wikidata.org/sparql'):
+        """
+        Remove cached lookups of releases of a database, so the next get_or_create queries for them again.
+        Needed if releases are created or changed by something other than get_or_create while the cache is in use
+
+        :param edition_of_wdid: wikidata qid of the database
+        :type edition_of_wdid: str
+        :param edition: (optional) only remove this release. By default, all releases of the database are removed
+        :type edition: str
+        :param sparql_endpoint_url: (optional)
+        :type sparql_endpoint_url: str
+        """
+        with cls._cache_lock:
+            cls._edition_dict_cache.pop((sparql_endpoint_url, edition_of_wdid), None)
+            if edition is not None:
+                cls._release_cache.pop((sparql_endpoint_url, edition_of_wdid, str(edition).strip()), None)
+            else:
+                # iterate over a copy of the keys, other threads may be adding releases
+                for key in [k for k in list(cls._release_cache) if k[:2] == (sparql_endpoint_url, edition_of_wdid)]:
+                    cls._release_cache.pop(key, None)
+
+    @classmethod
+    def _lock_for(cls, key):
+        return cls._key_locks[hash(key) % len(cls._key_locks)]
+
+    @classmethod
+    def _add_to_edition_dict_cache(cls, sparql_endpoint_url, edition_of_qid, edition, qid):
+        # add a release that was just created to the cached releases of its database, so they stay usable
+        key = (sparql_endpoint_url, edition_of_qid)
+        with cls._cache_lock:
+            cached = cls._edition_dict_cache.get(key)
+            if cached:
+                # a new dict, the cached one may have been returned by _get_edition_dict and be in use
+                edition_dict = dict(cached[1] or {})
+                edition_dict[edition] = qid
+                cls._edition_dict_cache[key] = (cached[0], edition_dict)
+
+    @classmethod
+    def _get_edition_dict(cls, helper, edition_of_qid, session=None, checked_since=None):
+        # edition number -> qid of all releases of edition_of_qid, filtered by edition of and instance of edition.
+        # the result is cached for edition_dict_cache_ttl seconds, so releases of the same database share one query.
+        # with checked_since (a time.monotonic() value), a cached result is only used if it was queried after that
+        key = (helper.sparql_endpoint_url, edition_of_qid)
+        cached = cls._edition_dict_cache.get(key)
+        if cached and time.monotonic() - cached[0] < cls.edition_dict_cache_ttl and \
+                (checked_since is None or cached[0] >= checked_since):
+            return cached[1]
+
+        queried_at = time.monotonic()
         edition_dict = id_mapper(helper.get_pid("P393"),
-                                 ((helper.get_pid("P629"), self.edition_of_qid),
+                                 ((helper.get_pid("P629"), edition_of_qid),
                                   (helper.get_pid("P31"), helper.get_qid("Q3331189"))),
-                                 endpoint=self.sparql_endpoint_url)
+                                 endpoint=helper.sparql_endpoint_url, session=session)
+        cls._edition_dict_cache[key] = (queried_at, edition_dict)
         return edition_dict
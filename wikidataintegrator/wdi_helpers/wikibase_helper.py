@@ -13,14 +13,21 @@ class WikibaseHelper:
     'http://www.w3.org/2002/07/owl#equivalentClass' respectively
     """
 
-    def __init__(self, sparql_endpoint_url='https://query.wikidata.org/sparql'):
+    def __init__(self, sparql_endpoint_url='https://query.wikidata.org/sparql', session=None):
+        """
+        :param sparql_endpoint_url: sparql endpoint of the wikibase
+        :param session: (optional) requests session used for all queries. see WDItemEngine.execute_sparql_query
+        :type session: requests.Session
+        """
         self.sparql_endpoint_url = sparql_endpoint_url
+        self.session = session
         # a map of property URIs to a PID in the wikibase you are using
         try:
             equiv_prop_pid = self.guess_equivalent_property_pid()
         except Exception:
             raise ValueError("Error: No property found with URI 'http://www.w3.org/2002/07/owl#equivalentProperty'")
-        uri_pid = id_mapper(equiv_prop_pid, endpoint=self.sparql_endpoint_url, return_as_set=True)
+        uri_pid = id_mapper(equiv_prop_pid, endpoint=self.sparql_endpoint_url, return_as_set=True,
+                            session=self.session)
         # remove duplicates/conflicts
         self.URI_PID = {k: list(v)[0] for k, v in uri_pid.items() if len(v) == 1}
         # get equivalent class PID
@@ -29,7 +36,7 @@ class WikibaseHelper:
         equiv_class_pid = self.URI_PID['http://www.w3.org/2002/07/owl#equivalentClass']
         # a map of item URIs to a QID in the wikibase you are using
         uri_qid = id_mapper(equiv_class_pid, endpoint=self.sparql_endpoint_url,
-                            return_as_set=True)
+                            return_as_set=True, session=self.session)
         # remove duplicates/conflicts
         self.URI_QID = {k: list(v)[0] for k, v in uri_qid.items() if len(v) == 1}
 
@@ -39,7 +46,8 @@ class WikibaseHelper:
           ?item ?prop <http://www.w3.org/2002/07/owl#equivalentProperty> .
           ?item <http://wikiba.se/ontology#directClaim> ?prop .
         }'''
-        pid = wdi_core.WDItemEngine.execute_sparql_query(query, endpoint=self.sparql_endpoint_url)
+        pid = wdi_core.WDItemEngine.execute_sparql_query(query, endpoint=self.sparql_endpoint_url,
+                                                         session=self.session)
         pid = pid['results']['bindings'][0]['prop']['value']
         pid = pid.split("/")[-1]
         return pid
@@ -90,7 +98,8 @@ class WikibaseHelper:
         }}"""
         query = query.format(prop=prop, value=value, equiv_class_pid=equiv_class_pid)
 
-        results = wdi_core.WDItemEngine.execute_sparql_query(query, endpoint=self.sparql_endpoint_url)
+        results = wdi_core.WDItemEngine.execute_sparql_query(query, endpoint=self.sparql_endpoint_url,
+                                                             session=self.session)
         result = results['results']['bindings']
         if len(result) == 0:
             return None
@@ -126,7 +135,8 @@ class WikibaseHelper:
         }}
         """.format(prop=prop, filter_str=filter_str)
 
-        results = wdi_core.WDItemEngine.execute_sparql_query(query, endpoint=self.sparql_endpoint_url)['results']['bindings']
+        results = wdi_core.WDItemEngine.execute_sparql_query(query, endpoint=self.sparql_endpoint_url,
+                                                             session=self.session)['results']['bindings']
         results = [{k: v['value'] for k, v in x.items()} for x in results]
         for r in results:
             r['localitem'] = r['localitem'].split('/')[-1]